@@ -1,8 +1,13 @@
+import heapq
 import os
-import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from html import escape as _h
 import feedparser
+import orjson
 from dateutil import parser as dtp
 
 # Your RSS feeds
@@ -14,37 +19,135 @@ SITE_DIR = "site"
 
 FILMS_JSONL = os.path.join(DATA_DIR, "films.jsonl")
 BOOKS_JSONL = os.path.join(DATA_DIR, "books.jsonl")
+FILMS_IDS = os.path.join(DATA_DIR, "films.ids.txt")
+BOOKS_IDS = os.path.join(DATA_DIR, "books.ids.txt")
+FEED_STATE_JSON = os.path.join(DATA_DIR, "feed_state.json")
+
+_LB_STARS_RE = re.compile(r"(★+½?)")
+_GR_RATING_RE = re.compile(r"rating:\s*([0-5])", re.IGNORECASE)
 
 def ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(SITE_DIR, exist_ok=True)
 
+def _load_line(line):
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+def read_jsonl(path):
+    # One read + splitlines is cheaper than iterating the file object,
+    # and the whole history comfortably fits in memory
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    objs = [_load_line(line) for line in data.splitlines() if line]
+    return [obj for obj in objs if obj is not None]
+
 def load_ids(path):
     ids = set()
-    if not os.path.exists(path):
-        return ids
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-                ids.add(obj["id"])
-            except:
-                pass
+    for obj in read_jsonl(path):
+        try:
+            ids.add(obj["id"])
+        except (KeyError, TypeError):
+            pass
     return ids
 
-def append_jsonl(path, items):
+def _jsonl_stamp(jsonl_path):
+    st = os.stat(jsonl_path)
+    return f"{st.st_size} {st.st_mtime_ns}"
+
+def _write_ids_stamp(ids_path, jsonl_path):
+    with open(ids_path + ".stamp", "w", encoding="utf-8") as f:
+        f.write(_jsonl_stamp(jsonl_path))
+
+def load_ids_fast(ids_path, jsonl_path):
+    # The ids sidecar holds one id per line, so dedup doesn't have to decode
+    # the whole history. Next to it, a stamp records the JSONL's size and
+    # mtime as of the last sidecar write; if the JSONL no longer matches
+    # (or either file is missing), the sidecar is rebuilt from the JSONL.
+    if not os.path.exists(jsonl_path):
+        return set()
+    stamp_path = ids_path + ".stamp"
+    if os.path.exists(ids_path) and os.path.exists(stamp_path):
+        with open(stamp_path, "r", encoding="utf-8") as f:
+            stamp = f.read()
+        if stamp == _jsonl_stamp(jsonl_path):
+            with open(ids_path, "r", encoding="utf-8") as f:
+                return set(f.read().splitlines())
+
+    ids = load_ids(jsonl_path)
+    with open(ids_path, "w", encoding="utf-8") as f:
+        f.write("".join(i + "\n" for i in ids))
+    _write_ids_stamp(ids_path, jsonl_path)
+    return ids
+
+def append_jsonl(path, items, ids_path):
     if not items:
         return
-    with open(path, "a", encoding="utf-8") as f:
-        for it in items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+    # One write per file instead of one per item
+    buf = b"".join(orjson.dumps(it) + b"\n" for it in items)
+    ids_buf = "".join(it["id"] + "\n" for it in items)
+    # The JSONL is the source of truth, so it's written first, then the ids,
+    # then the stamp. If we die anywhere in between, the stamp no longer
+    # matches the JSONL and load_ids_fast() rebuilds the sidecar.
+    with open(path, "ab") as f:
+        f.write(buf)
+    with open(ids_path, "a", encoding="utf-8") as f:
+        f.write(ids_buf)
+    _write_ids_stamp(ids_path, path)
+
+def load_feed_state(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            state = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    # Anything but an object (e.g. left behind by a bad write) is ignored
+    return state if isinstance(state, dict) else {}
+
+def save_feed_state(path, state):
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+
+def fetch_feed(feed_url, state):
+    # Conditional GET: send back the validators from the last run so an
+    # unchanged feed comes back as a bodyless 304
+    prev = state.get(feed_url) or {}
+    d = feedparser.parse(feed_url, etag=prev.get("etag"), modified=prev.get("modified"))
+    if d.get("status") == 304:
+        return None
+    if d.get("etag") or d.get("modified"):
+        state[feed_url] = {"etag": d.get("etag"), "modified": d.get("modified")}
+    return d
+
+@lru_cache(maxsize=4096)
+def _parse_iso(s):
+    # Feed dates are RFC 822 (RSS) or ISO 8601 (Atom); both have C-speed
+    # parsers in the stdlib. dateutil is only the last resort.
+    try:
+        dt = parsedate_to_datetime(s)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(s)
+        except ValueError:
+            dt = dtp.parse(s)
+    return dt.astimezone(timezone.utc).isoformat()
 
 def parse_date(entry):
     for key in ("published", "updated"):
+        # feedparser has usually already parsed the date into a UTC struct_time
+        parsed = getattr(entry, key + "_parsed", None)
+        if parsed:
+            return datetime(*parsed[:6], tzinfo=timezone.utc).isoformat()
         if getattr(entry, key, None):
             try:
-                return dtp.parse(getattr(entry, key)).astimezone(timezone.utc).isoformat()
-            except:
+                return _parse_iso(getattr(entry, key))
+            except (ValueError, OverflowError):
                 pass
     return datetime.now(timezone.utc).isoformat()
 
@@ -52,32 +155,42 @@ def stars_to_5(star_str):
     full = star_str.count("★")
     half = 1 if "½" in star_str else 0
     val = full + (0.5 if half else 0.0)
-    return int(round(val))
+    # A title can carry more stars than the 5-point scale has
+    return min(5, int(round(val)))
+
+_STAR_TABLE = tuple("★" * n + "☆" * (5 - n) for n in range(6))
 
 def rating_to_stars(n):
-    if n is None:
-        return None
-    return "★" * n + "☆" * (5 - n)
+    return None if n is None else _STAR_TABLE[n]
 
-def normalize_letterboxd(feed_url):
-    d = feedparser.parse(feed_url)
+def normalize_letterboxd(feed_url, state, seen):
+    d = fetch_feed(feed_url, state)
     out = []
+    if d is None:
+        return out
     for e in d.entries:
         link = e.get("link", "").strip()
         guid = e.get("id", "").strip() or link
+        eid = f"letterboxd:{guid}"
+        # Feeds re-deliver old entries every poll; skip them before doing
+        # any of the parsing below. New ids go into seen as well, so an entry
+        # repeated within the same feed is only normalized (and stored) once.
+        if eid in seen:
+            continue
+        seen.add(eid)
         title = (e.get("title", "") or "").strip()
         summary = (e.get("summary", "") or "").strip()
 
         rating = None
-        m = re.search(r"(★+½?)", title)
+        m = _LB_STARS_RE.search(title)
         if m:
             try:
                 rating = stars_to_5(m.group(1))
-            except:
+            except ValueError:
                 rating = None
 
         out.append({
-            "id": f"letterboxd:{guid}",
+            "id": eid,
             "title": title,
             "link": link,
             "rating_stars": rating_to_stars(rating),
@@ -86,25 +199,31 @@ def normalize_letterboxd(feed_url):
         })
     return out
 
-def normalize_goodreads(feed_url):
-    d = feedparser.parse(feed_url)
+def normalize_goodreads(feed_url, state, seen):
+    d = fetch_feed(feed_url, state)
     out = []
+    if d is None:
+        return out
     for e in d.entries:
         link = e.get("link", "").strip()
         guid = e.get("id", "").strip() or link
+        eid = f"goodreads:{guid}"
+        if eid in seen:
+            continue
+        seen.add(eid)
         title = (e.get("title", "") or "").strip()
         summary = (e.get("summary", "") or "").strip()
 
         rating = None
-        m = re.search(r"rating:\s*([0-5])", summary, re.IGNORECASE)
+        m = _GR_RATING_RE.search(summary)
         if m:
             try:
                 rating = int(m.group(1))
-            except:
+            except ValueError:
                 rating = None
 
         out.append({
-            "id": f"goodreads:{guid}",
+            "id": eid,
             "title": title,
             "link": link,
             "rating_stars": rating_to_stars(rating),
@@ -113,23 +232,30 @@ def normalize_goodreads(feed_url):
         })
     return out
 
+def _date_key(x):
+    return x.get("date_utc", "")
+
 def load_all_jsonl(path):
-    items = []
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    items.append(json.loads(line))
-                except:
-                    pass
-    return sorted(items, key=lambda x: x.get("date_utc", ""), reverse=True)
+    items = read_jsonl(path)
+    return sorted(items, key=_date_key, reverse=True)
 
-def render_page(title, items, out_path, gen_time):
+def merge_items(history, new_items):
+    # history is already newest-first, so only the new items need sorting
+    new_items = sorted(new_items, key=_date_key, reverse=True)
+    return list(heapq.merge(history, new_items, key=_date_key, reverse=True))
+
+# Bump whenever render_entry() or the entry markup changes, so pages holding
+# entries in the old format get a full re-render instead of being copied through
+RENDER_VERSION = 1
+_ENTRIES_START_RE = re.compile(r"<!-- entries:start v=(\d+) newest=(\S*) -->\n")
+_ENTRIES_END = "<!-- entries:end -->\n"
+PAGE_TAIL = _ENTRIES_END + "</body>\n</html>"
+
+def render_head(title, gen_time, newest):
     # Decide which CSS to use based on page title
     css_file = "css/films.css" if title.lower() == "films" else "css/books.css"
 
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(f"""<!doctype html>
+    return f"""<!doctype html>
 <html>
 <head>
   <meta charset="UTF-8">
@@ -139,43 +265,122 @@ def render_page(title, items, out_path, gen_time):
 <body>
   <a href="index.html" class="back-home-btn">← Back to Home</a>
   <h1>{title}</h1>
-  <p>Generated {gen_time}</p>
-""")
+  <p>Updated {gen_time}</p>
+<!-- entries:start v={RENDER_VERSION} newest={newest} -->
+"""
 
-        for it in items:
-            stars = it.get("rating_stars") or ""
-            review = it.get("review_html") or ""
-            title_text = it.get("title") or ""
-            link = it.get("link") or ""
+_ENTRY_TMPL = '<div class="entry">\n<h2><a href="%s">%s</a></h2>\n%s%s</div>\n<hr>\n'
+_ENTRY_NOLINK_TMPL = '<div class="entry">\n<h2>%s</h2>\n%s%s</div>\n<hr>\n'
+_RATING_TMPL = '<p class="rating">%s</p>\n'
+_REVIEW_TMPL = '<p class="review">%s</p>\n'
 
-            f.write('<div class="entry">\n')
-            if link:
-                f.write(f'<h2><a href="{link}">{title_text}</a></h2>\n')
-            else:
-                f.write(f'<h2>{title_text}</h2>\n')
+def render_entry(it):
+    # Titles, links and ratings are plain text from the feed; review_html is
+    # the feed's own HTML and goes through untouched
+    stars = _h(it.get("rating_stars") or "")
+    review = it.get("review_html") or ""
+    title_text = _h(it.get("title") or "")
+    link = _h(it.get("link") or "", quote=True)
 
-            if stars:
-                f.write(f'<p class="rating">{stars}</p>\n')
-            if review:
-                f.write(f'<p class="review">{review}</p>\n')
+    rating_html = _RATING_TMPL % stars if stars else ""
+    review_block = _REVIEW_TMPL % review if review else ""
+    if link:
+        return _ENTRY_TMPL % (link, title_text, rating_html, review_block)
+    return _ENTRY_NOLINK_TMPL % (title_text, rating_html, review_block)
 
-            f.write("</div>\n<hr>\n")
+def render_page(title, items, out_path, gen_time):
+    newest = items[0].get("date_utc", "") if items else ""
+
+    # Build the whole page in memory and hand it to a single write
+    parts = [render_head(title, gen_time, newest)]
+    parts_append = parts.append
+    for it in items:
+        parts_append(render_entry(it))
+    parts_append(PAGE_TAIL)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+def build_incremental_page(title, new_items, out_path, gen_time):
+    # Pages are newest-first, so new entries go straight after the head and
+    # the already rendered entries are copied over untouched. Returns None
+    # when that isn't possible (no page yet, page predates the markers or the
+    # current RENDER_VERSION, or a new item is older than the page) so the
+    # caller can do a full render.
+    if not os.path.exists(out_path):
+        return None
+    with open(out_path, "r", encoding="utf-8") as f:
+        page = f.read()
+
+    m = _ENTRIES_START_RE.search(page)
+    body_end = page.rfind(_ENTRIES_END)
+    if not m or body_end < m.end() or int(m.group(1)) != RENDER_VERSION:
+        return None
+
+    newest = m.group(2)
+    new_items = sorted(new_items, key=_date_key, reverse=True)
+    if new_items:
+        if new_items[-1].get("date_utc", "") < newest:
+            return None
+        newest = new_items[0].get("date_utc", "")
+
+    parts = [render_head(title, gen_time, newest)]
+    parts.extend(render_entry(it) for it in new_items)
+    parts.append(page[m.end():body_end])
+    parts.append(PAGE_TAIL)
+    return "".join(parts)
+
+def page_is_current(out_path):
+    # The start marker sits right after the short head, so there's no need
+    # to read the whole page to check its RENDER_VERSION
+    if not os.path.exists(out_path):
+        return False
+    with open(out_path, "r", encoding="utf-8") as f:
+        head = f.read(4096)
+    m = _ENTRIES_START_RE.search(head)
+    return bool(m) and int(m.group(1)) == RENDER_VERSION
+
+def update_library(title, new_items, jsonl_path, ids_path, out_path, gen_time):
+    # The libraries are append-only, so a page in the current format only
+    # needs touching when there's something new to put on it
+    if not new_items and page_is_current(out_path):
+        return
+
+    page = build_incremental_page(title, new_items, out_path, gen_time)
+    # A full render merges the new items into the history in memory, so
+    # read the history before the new items are appended to it
+    history = load_all_jsonl(jsonl_path) if page is None else None
+
+    # Records go on disk before the page does. Dying in between leaves an
+    # entry missing from the page until the next full render; the other way
+    # round it would count as new next run and be shown twice for good.
+    append_jsonl(jsonl_path, new_items, ids_path)
+    if page is None:
+        render_page(title, merge_items(history, new_items), out_path, gen_time)
+    else:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(page)
 
-        f.write("</body>\n</html>")
 def main():
     ensure_dirs()
-    seen_films = load_ids(FILMS_JSONL)
-    seen_books = load_ids(BOOKS_JSONL)
-
-    new_films = [x for x in normalize_letterboxd(LETTERBOXD_RSS) if x["id"] not in seen_films]
-    new_books = [x for x in normalize_goodreads(GOODREADS_READ_RSS) if x["id"] not in seen_books]
+    seen_films = load_ids_fast(FILMS_IDS, FILMS_JSONL)
+    seen_books = load_ids_fast(BOOKS_IDS, BOOKS_JSONL)
+    feed_state = load_feed_state(FEED_STATE_JSON)
+    prev_state = dict(feed_state)
 
-    append_jsonl(FILMS_JSONL, new_films)
-    append_jsonl(BOOKS_JSONL, new_books)
+    # Both fetches are network-bound, so run them side by side
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_lb = ex.submit(normalize_letterboxd, LETTERBOXD_RSS, feed_state, seen_films)
+        fut_gr = ex.submit(normalize_goodreads, GOODREADS_READ_RSS, feed_state, seen_books)
+        new_films, new_books = fut_lb.result(), fut_gr.result()
 
+    # Feed state is only saved once everything is on disk, so a failed run
+    # re-fetches the same entries next time
     now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-    render_page("Films", load_all_jsonl(FILMS_JSONL), os.path.join(SITE_DIR, "films.html"), now)
-    render_page("Books", load_all_jsonl(BOOKS_JSONL), os.path.join(SITE_DIR, "books.html"), now)
+    update_library("Films", new_films, FILMS_JSONL, FILMS_IDS, os.path.join(SITE_DIR, "films.html"), now)
+    update_library("Books", new_books, BOOKS_JSONL, BOOKS_IDS, os.path.join(SITE_DIR, "books.html"), now)
+    if feed_state != prev_state:
+        save_feed_state(FEED_STATE_JSON, feed_state)
 
 if __name__ == "__main__":
     main()